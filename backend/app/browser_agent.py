@@ -1,16 +1,22 @@
-import random
+import datetime
 import os
 import time
 import base64
+import functools
 import numpy as np
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from itertools import islice
+from urllib.parse import urlparse
 from PIL import Image
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
+import httpx
 from openai import OpenAI
 from dotenv import load_dotenv
 import re
@@ -18,6 +24,133 @@ import re
 # Load environment variables from .env file
 load_dotenv()
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _mean_abs_diff_u8(a, b):
+        """Mean absolute difference of two equal-shape uint8 arrays, in [0, 1]"""
+        flat_a = a.ravel()
+        flat_b = b.ravel()
+        n = flat_a.size
+        s = 0.0
+        for i in numba.prange(n):
+            s += abs(int(flat_a[i]) - int(flat_b[i]))
+        return s / (n * 255.0)
+else:
+    def _mean_abs_diff_u8(a, b):
+        """Mean absolute difference of two equal-shape uint8 arrays, in [0, 1]"""
+        diff = np.subtract(a, b, dtype=np.int16)
+        return np.abs(diff, out=diff).mean() / 255.0
+
+# Page-side helpers injected once per navigation so element lookups don't
+# re-ship and re-compile the same script on every call
+_PAGE_HELPERS_JS = """
+window.__findInShadow = function(selector) {
+    function getAllShadowHosts(root) {
+        const hosts = [];
+        const walker = document.createTreeWalker(
+            root, NodeFilter.SHOW_ELEMENT, null, false
+        );
+        while (walker.nextNode()) {
+            if (walker.currentNode.shadowRoot) {
+                hosts.push(walker.currentNode);
+            }
+        }
+        return hosts;
+    }
+
+    const allElements = [];
+    const shadowHosts = getAllShadowHosts(document.body);
+    for (const host of shadowHosts) {
+        try {
+            const elements = host.shadowRoot.querySelectorAll(selector);
+            for (const el of elements) {
+                allElements.push(el);
+            }
+        } catch (e) {
+            console.error('Error searching shadow DOM:', e);
+        }
+    }
+    return allElements;
+};
+
+if (!window.__mutObserver) {
+    window.__mutCount = 0;
+    window.__mutObserver = new MutationObserver(function(mutations) {
+        window.__mutCount += mutations.length;
+    });
+    window.__mutObserver.observe(document, {
+        subtree: true, childList: true, attributes: true
+    });
+}
+
+window.__scrollClick = function(el) {
+    el.scrollIntoView({block: 'center'});
+    const urlBefore = location.href;
+    el.click();
+    return {clicked: true, urlBefore: urlBefore, urlAfter: location.href};
+};
+"""
+
+# Markup that costs prompt tokens without informing the model's decision
+_HTML_NOISE_RE = re.compile(
+    r"<script\b.*?</script>|<style\b.*?</style>|<svg\b.*?</svg>"
+    r"|<noscript\b.*?</noscript>|<!--.*?-->",
+    re.DOTALL | re.IGNORECASE)
+_DATA_URI_RE = re.compile(r"data:[^\"'\s]{32,}")
+_WS_RE = re.compile(r"\s+")
+
+# Precompiled patterns for hot selector/URL parsing paths
+_URL_SCHEME_RE = re.compile(r"^https?://")
+_CONTAINS_TEXT_RE = re.compile(r"contains\(text\(\),\s*['\"]([^'\"]+)['\"]")
+_ONCLICK_LOCATION_RE = re.compile(r"(?:location\.href|window\.location|location)\s*=\s*['\"]([^'\"]+)['\"]")
+
+# Decision prompt built once at import; the ~40-line static body dwarfs the
+# per-call variables, so the hot path only fills in three slots
+_DECISION_PROMPT = """
+Current URL: {url}
+Recent Actions:
+{actions}
+
+Current HTML (truncated):
+{html}
+
+I've attached a screenshot of the current state of the webpage.
+
+Based on the screenshot, HTML content, and previous actions, determine the next best action to complete the user's task.
+
+NAVIGATION MENU STRATEGY:
+For navigation menu items, ALWAYS try hovering first before clicking, as many menus reveal options on hover.
+If you've already hovered over an element and saw no changes, then try clicking it.
+
+Available actions:
+1. Hover: Identify an element to hover over (provide CSS selector or XPath) - Example: "action: hover, selector: .dropdown-menu"
+2. Click: Identify a specific element to click (provide CSS selector or XPath) - Example: "action: click, selector: #submit-button"
+3. Scroll: Scroll the page to see more content (specify amount in pixels, positive for down, negative for up) - Example: "action: scroll, amount: 500"
+4. Complete: If you believe the task is complete - Example: "action: complete"
+
+For hover and click actions, analyze the HTML to provide the EXACT CSS selector or XPath for the element.
+Be specific and ensure your action directly contributes to the task.
+
+Return your decision in a consistent format:
+action: [action type]
+selector: [CSS selector or XPath for the element] (only for click/hover)
+amount: [scroll amount in pixels] (only for scroll)
+reasoning: [brief explanation of why this action]
+""".format
+
+# Splits a multiplexed batch reply back into per-prompt answers
+_BATCH_ANSWER_RE = re.compile(r'^###\s*Answer\s+(\d+)\s*$', re.MULTILINE)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,105 +161,262 @@ logging.basicConfig(
 )
 logger = logging.getLogger('BrowserAgent')
 
-# Create OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Create OpenAI client with a persistent HTTP/2 connection pool so the many
+# small sequential LLM calls don't each pay TLS + handshake overhead
+client = OpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    http_client=httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=300),
+        timeout=30.0
+    )
+)
 
 class BrowserAgent:
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, min_action_delay=0.0):
         # Configure and initialize undetected_chromedriver
         logger.info("Initializing undetected Chrome browser")
         options = uc.ChromeOptions()
         if headless:
             logger.info("Running in headless mode")
-            options.add_argument('--headless')
+            # New headless shares the rendering pipeline with headed Chrome
+            # and is noticeably faster for screenshots than legacy --headless
+            options.add_argument('--headless=new')
         else:
             logger.info("Running in visible mode")
-        
+
         options.add_argument('--no-sandbox')
         options.add_argument('--window-size=1280,800')
-        options.add_argument('--disable-gpu')
         options.add_argument('--disable-dev-shm-usage')
+        # Return from driver.get once the DOM is interactive instead of
+        # waiting for every subresource (ads, fonts, analytics); element-level
+        # waits handle the rest
+        options.page_load_strategy = 'eager'
         
         # Initialize the undetected_chromedriver
         logger.info("Starting Chrome instance...")
         self.driver = uc.Chrome(options=options)
         self.driver.set_window_size(1280, 800)
         logger.info("Chrome started successfully")
+
+        # Hundreds of WebDriver commands flow over this channel per task;
+        # make sure they reuse connections instead of re-handshaking
+        self._tune_command_channel()
         
         # Set a reasonable page load timeout
         self.driver.set_page_load_timeout(30)
         
-        # Store state
-        self.action_history = []
+        # Optional pacing delay between actions; 0 means proceed as soon
+        # as the browser is ready
+        self.min_action_delay = min_action_delay
+
+        # Store state; only the last few actions are ever read back, so a
+        # bounded deque keeps long sessions at constant memory
+        self.action_history = deque(maxlen=64)
+        # Monotonic count of recorded actions; unlike len(action_history)
+        # it keeps advancing once the bounded deque is full, so caches can
+        # key on it safely
+        self._action_seq = 0
         self.current_url = ""
         self.last_screenshot = None
+        self._last_jpeg_b64 = None
+        # One-entry HTML cache so repeated get_html calls within a single
+        # decision cycle don't re-serialize the DOM
+        self._html_cache = None
+        # One-entry cache for the cleaned prompt HTML; when an action has
+        # no effect the same DOM gets truncated again next step
+        self._truncate_cache = None
+        # Reusable output buffer for JPEG re-encoding so each screenshot
+        # doesn't allocate and free a multi-MB BytesIO
+        self._jpeg_buf = BytesIO()
+        # LLM URL-relevance answers keyed by (task, url set); temperature=0
+        # makes repeat calls deterministic, so cache hits are safe
+        self._url_relevance_cache = {}
+        # Worker pool for overlapping screenshot decodes with browser I/O;
+        # PIL and NumPy release the GIL so the overlap is real
+        self._decode_pool = ThreadPoolExecutor(max_workers=2)
+        # Shared element wait; 200ms polling halves typical wait latency
+        # versus Selenium's 500ms default
+        self._wait = WebDriverWait(self.driver, 5, poll_frequency=0.2)
         logger.info("Browser agent initialized and ready")
     
+    def _record_action(self, entry):
+        """Append to the action history and bump the action counter"""
+        self.action_history.append(entry)
+        self._action_seq += 1
+
+    def _tune_command_channel(self):
+        """Enable keep-alive and enlarge the urllib3 pool for driver commands
+
+        The default remote-connection pool holds a single connection, which
+        serialises concurrent commands and logs "connection pool is full"
+        warnings under the decode/screenshot overlap.
+        """
+        try:
+            import urllib3
+            executor = self.driver.command_executor
+            executor.keep_alive = True
+            if hasattr(executor, '_conn'):
+                executor._conn = urllib3.PoolManager(maxsize=20, block=False)
+            logger.info("Selenium command channel: keep-alive on, pool maxsize 20")
+        except Exception as e:
+            logger.warning(f"Could not tune Selenium command channel: {e}")
+
     def navigate(self, url):
         """Navigate to URL using undetected_chromedriver"""
         try:
             logger.info(f"Navigating to URL: {url}")
             self.driver.get(url)
             
-            # Wait for the page to load
+            # Wait for the page to load - event-driven rather than a fixed
+            # sleep, so fast pages don't pay a 2 second wall-clock tax
             logger.info("Waiting for page to load...")
-            time.sleep(2)
-            
+            try:
+                WebDriverWait(self.driver, 10).until(
+                    lambda d: d.execute_script('return document.readyState') == 'complete'
+                )
+            except TimeoutException:
+                logger.warning("Page did not reach readyState 'complete' within 10s, continuing")
+
+            # Fresh document - re-install our page-side helpers
+            self._inject_page_helpers()
+
             self.current_url = url
-            self.action_history.append(f"Navigated to {url}")
+            self._record_action(f"Navigated to {url}")
             logger.info(f"Successfully loaded URL: {url}")
             return True
         except Exception as e:
             logger.error(f"Navigation failed: {str(e)}")
-            self.action_history.append(f"Navigation error: {e}")
             return False
     
+    def _capture_jpeg_base64(self):
+        """Capture the viewport as base64 JPEG via CDP, avoiding PNG entirely"""
+        result = self.driver.execute_cdp_cmd('Page.captureScreenshot', {
+            'format': 'jpeg',
+            'quality': 70,
+            'captureBeyondViewport': False
+        })
+        return result['data']
+
+    def _capture(self):
+        """Capture one logical frame, caching both raw bytes and base64 JPEG
+
+        Everything downstream (diffing, the vision prompt, clients) reads
+        from this single capture instead of triggering its own encode/decode
+        cycle in Chrome.
+        """
+        try:
+            # JPEG via CDP skips Chrome's zlib PNG encode and our PNG decode
+            self._last_jpeg_b64 = self._capture_jpeg_base64()
+            self.last_screenshot = base64.b64decode(self._last_jpeg_b64)
+        except Exception as e:
+            logger.warning(f"CDP screenshot failed, falling back to PNG: {e}")
+            self.last_screenshot = self.driver.get_screenshot_as_png()
+            self._last_jpeg_b64 = None
+        return self.last_screenshot
+
     def screenshot(self):
         """Take a screenshot with undetected_chromedriver"""
         logger.debug("Taking screenshot")
-        screenshot_bytes = self.driver.get_screenshot_as_png()
-        self.last_screenshot = screenshot_bytes
-        return screenshot_bytes
-    
+        return self._capture()
+
     def get_screenshot_base64(self):
         """Get screenshot as base64 for embedding in prompts"""
         logger.debug("Taking base64 screenshot for AI model")
-        screenshot_bytes = self.driver.get_screenshot_as_png()
-        self.last_screenshot = screenshot_bytes
-        
-        # Convert to JPEG and optimize for size
-        img = Image.open(BytesIO(screenshot_bytes))
+        self._capture()
+        if self._last_jpeg_b64 is not None:
+            # Chrome already handed us base64 JPEG - no PIL round trip needed
+            return self._last_jpeg_b64
+
+        # PNG fallback: convert to JPEG and optimize for size, reusing the
+        # output buffer
+        img = Image.open(BytesIO(self.last_screenshot))
         if img.mode == 'RGBA':
             img = img.convert('RGB')
-        buffer = BytesIO()
-        img.save(buffer, format="JPEG", quality=70)
+        if max(img.size) > 1280:
+            # GPT-4o downscales internally anyway; don't pay to upload more
+            img.thumbnail((1280, 1280))
+        buffer = self._jpeg_buf
+        buffer.seek(0)
+        buffer.truncate()
+        img.save(buffer, format="JPEG", quality=70, optimize=True, progressive=True)
         logger.debug("Screenshot processed and encoded")
-        return base64.b64encode(buffer.getvalue()).decode("utf-8")
+        # getbuffer() avoids copying the JPEG bytes out of the BytesIO, and
+        # base64 output is pure ASCII so take the fast decoder path
+        return base64.b64encode(buffer.getbuffer()).decode("ascii")
     
+    def _decode_for_compare(self, screenshot_bytes, size=(160, 100)):
+        """Decode a screenshot at reduced scale for cheap visual comparison"""
+        img = Image.open(BytesIO(screenshot_bytes))
+        # Let the decoder downscale where it can (JPEG IDCT scaling), then
+        # thumbnail the rest of the way - we never materialize the full frame
+        img.draft('RGB', size)
+        img.thumbnail(size)
+        return np.asarray(img.convert('RGB'))
+
     def _compare_screenshots(self, before_screenshot, after_screenshot, threshold=0.05):
         """Compare two screenshots and return True if they are different enough"""
         logger.debug(f"Comparing screenshots with threshold {threshold}")
         if before_screenshot is None or after_screenshot is None:
             logger.debug("One screenshot is None, considering them different")
             return True
-            
-        # Convert to numpy arrays for comparison
-        img1 = np.array(Image.open(BytesIO(before_screenshot)).convert('RGB'))
-        img2 = np.array(Image.open(BytesIO(after_screenshot)).convert('RGB'))
-        
+
+        # Identical-buffer prescan: an unchanged page re-encodes to the same
+        # JPEG bytes, so a memcmp short-circuits the whole decode+diff
+        if before_screenshot == after_screenshot:
+            logger.debug("Screenshots are byte-identical")
+            return False
+
+        # Decode small thumbnails instead of full-resolution frames
+        img1 = self._decode_for_compare(before_screenshot)
+        img2 = self._decode_for_compare(after_screenshot)
+        return self._compare_decoded(img1, img2, threshold)
+
+    def _compare_decoded(self, img1, img2, threshold=0.05, block=20):
+        """Compare two already-decoded comparison thumbnails"""
         # Check if dimensions match
         if img1.shape != img2.shape:
             logger.debug("Screenshot dimensions don't match, considering them different")
             return True
-            
-        # Calculate difference
-        diff = np.abs(img1.astype(np.float32) - img2.astype(np.float32)) / 255.0
-        diff_score = np.mean(diff)
-        
-        logger.debug(f"Screenshot difference score: {diff_score}")
-        return diff_score > threshold
+
+        # Decoded-pixel prescan for the common no-change case
+        if np.array_equal(img1, img2):
+            logger.debug("Screenshots are pixel-identical")
+            return False
+
+        h, w = img1.shape[:2]
+        if h % block or w % block:
+            # Odd thumbnail dimensions - fall back to the global reduction
+            diff_score = _mean_abs_diff_u8(img1, img2)
+            logger.debug(f"Screenshot difference score: {diff_score}")
+            return diff_score > threshold
+
+        # Block-level comparison: a localized change (dropdown, modal) that
+        # would drown in the full-image mean still trips its own block
+        diff = np.abs(np.subtract(img1, img2, dtype=np.int16))
+        blocks = diff.reshape(h // block, block, w // block, block, -1).swapaxes(1, 2)
+        block_means = blocks.mean(axis=(2, 3, 4)) / 255.0
+
+        logger.debug(f"Max block difference score: {block_means.max()}")
+        return bool((block_means > threshold).any())
     
-    def _validate_selector(self, selector):
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
+    def _classify_selector(selector):
+        """Return the (By, selector) pair for a CSS or XPath selector string
+
+        Pure and cached: retry loops classify the same 2-3 selectors dozens
+        of times.
+        """
+        # XPath can also start with '(' or './/'; require a '//' near the
+        # front so CSS class selectors like '.menu' aren't misclassified
+        if selector[:1] in ('/', '(', '.') and '//' in selector[:4]:
+            return By.XPATH, selector
+        return By.CSS_SELECTOR, selector
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _validate_selector(selector):
         """Validate if a selector is likely to work and fix common issues"""
         # Fix common LLM hallucination patterns
         if selector.startswith('a[href="') or selector.startswith('a[href=\''):
@@ -186,12 +476,37 @@ class BrowserAgent:
     def _find_elements_in_document(self, selector):
         """Find elements in the main document"""
         try:
-            by = By.XPATH if selector.startswith('//') else By.CSS_SELECTOR
+            by, selector = self._classify_selector(selector)
             return self.driver.find_elements(by, selector)
         except Exception as e:
             logger.warning(f"Error finding elements in document: {e}")
             return []
             
+    def _prescreen_frames(self, selector):
+        """Check all same-origin iframes for a CSS selector in one round trip
+
+        Returns a list with one entry per iframe: True/False where the frame
+        could be searched from the parent, None where it couldn't (cross-origin
+        or XPath selector) and a full in-frame search is still required.
+        """
+        if selector.startswith('//'):
+            # querySelector can't evaluate XPath; search every frame
+            return None
+        try:
+            return self.driver.execute_script("""
+                return Array.from(document.querySelectorAll('iframe')).map(f => {
+                    try {
+                        if (!f.contentDocument) return null;
+                        return f.contentDocument.querySelector(arguments[0]) !== null;
+                    } catch (e) {
+                        return null;
+                    }
+                });
+            """, selector)
+        except Exception as e:
+            logger.warning(f"Error prescreening iframes: {e}")
+            return None
+
     def _find_elements_in_frames(self, selector):
         """Find elements in all iframes"""
         all_elements = []
@@ -199,27 +514,46 @@ class BrowserAgent:
             # Get all iframes
             iframes = self.driver.find_elements(By.TAG_NAME, "iframe")
             logger.info(f"Found {len(iframes)} iframes to search")
-            
+
+            # One batched parent-side check tells us which same-origin frames
+            # contain a match, so we only pay switch_to round trips for frames
+            # that matched (or that we couldn't inspect from the parent)
+            prescreen = self._prescreen_frames(selector)
+
             # Save current context
             main_content = self.driver.current_window_handle
-            
+
             for i, iframe in enumerate(iframes):
+                if prescreen is not None and i < len(prescreen) and prescreen[i] is False:
+                    continue
                 try:
                     logger.info(f"Switching to iframe {i+1}/{len(iframes)}")
                     self.driver.switch_to.frame(iframe)
                     
-                    by = By.XPATH if selector.startswith('//') else By.CSS_SELECTOR
-                    elements = self.driver.find_elements(by, selector)
+                    # Probe for existence with a one-bool script first;
+                    # find_elements serializes every match over the wire,
+                    # which is wasted work when the frame has none
+                    if not selector.startswith('//') and not self.driver.execute_script(
+                            "return document.querySelector(arguments[0]) !== null;", selector):
+                        elements = []
+                    else:
+                        by, _ = self._classify_selector(selector)
+                        elements = self.driver.find_elements(by, selector)
                     if elements:
                         logger.info(f"Found {len(elements)} elements in iframe {i+1}")
                         all_elements.extend(elements)
-                        
+
                 except Exception as e:
                     logger.warning(f"Error searching iframe {i+1}: {e}")
-                    
+
                 # Switch back to main content
                 self.driver.switch_to.default_content()
-                
+
+                # Stop at the first frame that matched - callers only need
+                # one set of hits, not an exhaustive sweep of every iframe
+                if all_elements:
+                    return all_elements
+
             return all_elements
             
         except Exception as e:
@@ -231,50 +565,53 @@ class BrowserAgent:
                 pass
             return all_elements
             
+    def _inject_page_helpers(self):
+        """Install page-side helper functions once for the current document"""
+        try:
+            self.driver.execute_script(_PAGE_HELPERS_JS)
+        except Exception as e:
+            logger.warning(f"Error injecting page helpers: {e}")
+
+    def _mutation_token(self):
+        """Snapshot the page-side mutation counter; None if unavailable"""
+        try:
+            return self.driver.execute_script("return window.__mutCount;")
+        except Exception as e:
+            logger.debug(f"Mutation counter unavailable: {e}")
+            return None
+
+    def _page_changed_since(self, token):
+        """Whether the DOM mutated since the token was taken
+
+        Returns True/False from the page's MutationObserver counter, or None
+        when the counter isn't available and the caller needs a different
+        change oracle (e.g. a screenshot diff).
+        """
+        if token is None:
+            return None
+        try:
+            return self.driver.execute_script("return window.__mutCount;") != token
+        except Exception as e:
+            logger.debug(f"Mutation counter unavailable: {e}")
+            return None
+
     def _find_elements_in_shadow_dom(self, selector):
         """Find elements in shadow DOMs"""
         try:
-            # Execute JavaScript to search in shadow DOMs
-            shadow_elements = self.driver.execute_script(f"""
-                function getAllShadowHosts(root) {{
-                    const hosts = [];
-                    const walker = document.createTreeWalker(
-                        root, NodeFilter.SHOW_ELEMENT, null, false
-                    );
-                    
-                    while(walker.nextNode()) {{
-                        if (walker.currentNode.shadowRoot) {{
-                            hosts.push(walker.currentNode);
-                        }}
-                    }}
-                    
-                    return hosts;
-                }}
-                
-                function findElementsInShadowDom(selector) {{
-                    const allElements = [];
-                    const shadowHosts = getAllShadowHosts(document.body);
-                    
-                    for (const host of shadowHosts) {{
-                        try {{
-                            const elements = host.shadowRoot.querySelectorAll(selector);
-                            if (elements.length > 0) {{
-                                console.log('Found elements in shadow DOM:', elements.length);
-                                for (const el of elements) {{
-                                    allElements.push(el);
-                                }}
-                            }}
-                        }} catch(e) {{
-                            console.error('Error searching shadow DOM:', e);
-                        }}
-                    }}
-                    
-                    return allElements;
-                }}
-                
-                return findElementsInShadowDom("{selector}");
-            """)
-            
+            # The search function is predefined on the page; the selector is
+            # passed as an argument rather than interpolated into the script
+            shadow_elements = self.driver.execute_script(
+                "if (!window.__findInShadow) return null;"
+                "return window.__findInShadow(arguments[0]);",
+                selector
+            )
+            if shadow_elements is None:
+                # Helper missing (e.g. after a client-side navigation) - re-inject
+                self._inject_page_helpers()
+                shadow_elements = self.driver.execute_script(
+                    "return window.__findInShadow(arguments[0]);", selector
+                )
+
             if shadow_elements and len(shadow_elements) > 0:
                 logger.info(f"Found {len(shadow_elements)} elements in shadow DOM")
                 return shadow_elements
@@ -300,7 +637,7 @@ class BrowserAgent:
             # Extract the text we're looking for
             text_match = None
             if 'contains(text()' in selector:
-                match = re.search(r"contains\(text\(\),\s*['\"]([^'\"]+)['\"]", selector)
+                match = _CONTAINS_TEXT_RE.search(selector)
                 if match:
                     text_match = match.group(1)
             elif "href*=" in selector:
@@ -322,7 +659,7 @@ class BrowserAgent:
         if 'button[' in selector or selector == 'button':
             text_match = None
             if 'contains(text()' in selector:
-                match = re.search(r"contains\(text\(\),\s*['\"]([^'\"]+)['\"]", selector)
+                match = _CONTAINS_TEXT_RE.search(selector)
                 if match:
                     text_match = match.group(1)
                     
@@ -340,7 +677,7 @@ class BrowserAgent:
         for alt in alternatives:
             logger.info(f"Trying alternative selector: {alt}")
             try:
-                by = By.XPATH if alt.startswith('//') else By.CSS_SELECTOR
+                by, _ = self._classify_selector(alt)
                 elements = self.driver.find_elements(by, alt)
                 if elements:
                     return elements, alt
@@ -351,30 +688,32 @@ class BrowserAgent:
         
     def _debug_dump_page_links(self):
         """Dump all links on the page for debugging when an element can't be found"""
+        # This is diagnostics only - don't pay for full-page sweeps unless
+        # someone is actually reading debug logs
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
         try:
-            logger.info("🔍 Debugging - dumping all page links:")
-            links = self.driver.find_elements(By.TAG_NAME, "a")
-            logger.info(f"Found {len(links)} links on page")
-            
-            for i, link in enumerate(links[:20]):  # Limit to first 20 for brevity
-                try:
-                    href = link.get_attribute('href')
-                    text = link.text
-                    logger.info(f"Link {i+1}: href='{href}', text='{text}'")
-                except:
-                    pass
-                    
-            # Also get buttons
-            buttons = self.driver.find_elements(By.TAG_NAME, "button")
-            logger.info(f"Found {len(buttons)} buttons on page")
-            
-            for i, button in enumerate(buttons[:10]):  # Limit to first 10
-                try:
-                    text = button.text
-                    logger.info(f"Button {i+1}: text='{text}'")
-                except:
-                    pass
-                    
+            logger.debug("🔍 Debugging - dumping all page links:")
+            # Collect everything in one script call instead of a WebDriver
+            # round trip per link attribute
+            dump = self.driver.execute_script("""
+                return {
+                    linkCount: document.querySelectorAll('a').length,
+                    links: Array.from(document.querySelectorAll('a')).slice(0, 20)
+                        .map(a => [a.href, a.innerText]),
+                    buttonCount: document.querySelectorAll('button').length,
+                    buttons: Array.from(document.querySelectorAll('button')).slice(0, 10)
+                        .map(b => b.innerText)
+                };
+            """)
+            logger.debug(f"Found {dump['linkCount']} links on page")
+            for i, (href, text) in enumerate(dump['links']):
+                logger.debug(f"Link {i+1}: href='{href}', text='{text}'")
+
+            logger.debug(f"Found {dump['buttonCount']} buttons on page")
+            for i, text in enumerate(dump['buttons']):
+                logger.debug(f"Button {i+1}: text='{text}'")
+
         except Exception as e:
             logger.warning(f"Error dumping debug info: {e}")
     
@@ -383,11 +722,22 @@ class BrowserAgent:
         if not extracted_urls or len(extracted_urls) == 0:
             logger.info("No URLs to analyze for relevance")
             return None
-            
+
+        # Retries and repeat visits ask the same question about the same
+        # page - answer from cache instead of re-billing the LLM
+        cache_key = (current_task, tuple(sorted(extracted_urls)))
+        if cache_key in self._url_relevance_cache:
+            cached = self._url_relevance_cache[cache_key]
+            logger.info(f"Using cached URL relevance result: {cached}")
+            return cached
+
         logger.info(f"Asking LLM to select most relevant URL from {len(extracted_urls)} options for task: {current_task}")
         
         # Prepare a prompt for the LLM
-        url_list = "\n".join([f"{i+1}. {url}" for i, url in enumerate(extracted_urls)])
+        url_list = "\n".join(f"{i}. {url}" for i, url in enumerate(extracted_urls, 1))
+        # Set membership for the validation below - link-heavy pages can have
+        # hundreds of URLs and `in list` rescans them per check
+        urls_set = set(extracted_urls)
         
         try:
             response = client.chat.completions.create(
@@ -416,26 +766,67 @@ Do NOT include any explanation or additional text in your response.
             # Check if the response is "NONE" or an actual URL
             if result == "NONE":
                 logger.info("LLM determined no URLs are relevant to the current task")
+                self._url_relevance_cache[cache_key] = None
                 return None
-                
+
             # Validate that the returned value is one of our extracted URLs
-            if result in extracted_urls:
+            if result in urls_set:
                 logger.info(f"🎯 LLM selected relevant URL: {result}")
+                self._url_relevance_cache[cache_key] = result
                 return result
             else:
                 # Try to find a close match (in case of small differences)
                 for url in extracted_urls:
                     if url in result or result in url:
                         logger.info(f"🎯 LLM selected relevant URL (partial match): {url}")
+                        self._url_relevance_cache[cache_key] = url
                         return url
-                        
+
                 logger.warning(f"LLM returned a URL that wasn't in our list: {result}")
+                self._url_relevance_cache[cache_key] = None
                 return None
                 
         except Exception as e:
             logger.error(f"Error getting URL relevance from LLM: {e}")
             return None
             
+    def _batch_element_attrs(self, elements):
+        """Fetch the attributes URL extraction needs for all elements at once
+
+        Returns one dict per element with tag/href/onclick/dataUrl/childHrefs
+        keys. A single execute_script replaces the 5+ WebDriver round trips
+        per element the attribute reads would otherwise cost.
+        """
+        try:
+            return self.driver.execute_script("""
+                return arguments[0].map(e => ({
+                    tag: e.tagName.toLowerCase(),
+                    href: e.getAttribute('href'),
+                    onclick: e.getAttribute('onclick'),
+                    dataUrl: e.getAttribute('data-url'),
+                    childHrefs: Array.from(e.querySelectorAll('a')).map(a => a.href)
+                }));
+            """, elements)
+        except Exception as e:
+            logger.warning(f"Batched attribute read failed, falling back to per-element reads: {e}")
+
+        # Per-element WebDriver fallback (e.g. elements living in an iframe
+        # context the main-frame script can't touch)
+        attrs = []
+        for element in elements:
+            try:
+                attrs.append({
+                    'tag': element.tag_name,
+                    'href': element.get_attribute('href'),
+                    'onclick': element.get_attribute('onclick'),
+                    'dataUrl': element.get_attribute('data-url'),
+                    'childHrefs': [link.get_attribute('href')
+                                   for link in element.find_elements(By.TAG_NAME, 'a')]
+                })
+            except Exception as e:
+                logger.warning(f"Error reading element attributes: {e}")
+        return attrs
+
     def _extract_url_from_element(self, selector, current_task=None):
         """Extract URL from an element if it's a link and filter for relevance if task provided"""
         logger.debug(f"Extracting URL from element: {selector}")
@@ -451,76 +842,93 @@ Do NOT include any explanation or additional text in your response.
                 return None
                 
             extracted_urls = []
-            
-            for i, element in enumerate(elements):
+            # Skip building the interpolated log strings entirely when info
+            # logging is off - this loop can run over hundreds of links
+            log_info = logger.isEnabledFor(logging.INFO)
+
+            for i, attrs in enumerate(self._batch_element_attrs(elements)):
                 # Extract href for anchor tags
-                if element.tag_name == 'a':
-                    href = element.get_attribute('href')
+                if attrs['tag'] == 'a':
+                    href = attrs['href']
                     if href and href != "javascript:void(0);":
-                        logger.info(f"📌 Extracted URL #{i+1}: {href} (from href attribute)")
+                        if log_info:
+                            logger.info(f"📌 Extracted URL #{i+1}: {href} (from href attribute)")
                         extracted_urls.append(href)
                         continue
-                
+
                 # Look for onclick attributes with URLs
-                onclick = element.get_attribute('onclick')
+                onclick = attrs['onclick']
                 if onclick and 'location' in onclick:
-                    import re
-                    match = re.search(r"(?:location\.href|window\.location|location)\s*=\s*['\"]([^'\"]+)['\"]", onclick)
+                    match = _ONCLICK_LOCATION_RE.search(onclick)
                     if match:
                         url = match.group(1)
-                        logger.info(f"📌 Extracted URL #{i+1}: {url} (from onclick attribute)")
+                        if log_info:
+                            logger.info(f"📌 Extracted URL #{i+1}: {url} (from onclick attribute)")
                         extracted_urls.append(url)
                         continue
-                
+
                 # Look for data-url attributes
-                data_url = element.get_attribute('data-url')
+                data_url = attrs['dataUrl']
                 if data_url:
-                    logger.info(f"📌 Extracted URL #{i+1}: {data_url} (from data-url attribute)")
+                    if log_info:
+                        logger.info(f"📌 Extracted URL #{i+1}: {data_url} (from data-url attribute)")
                     extracted_urls.append(data_url)
                     continue
-                
+
                 # Try to find nested links
-                child_links = element.find_elements(By.TAG_NAME, 'a')
-                if child_links:
-                    for j, link in enumerate(child_links):
-                        href = link.get_attribute('href')
-                        if href and href != "javascript:void(0);":
+                for j, href in enumerate(attrs['childHrefs']):
+                    if href and href != "javascript:void(0);":
+                        if log_info:
                             logger.info(f"📌 Extracted URL #{i+1}.{j+1}: {href} (from nested link)")
-                            extracted_urls.append(href)
-            
+                        extracted_urls.append(href)
+
+            # Without a task to filter on, stop at the first navigable URL -
+            # no need to materialize the filtered list at all
+            if not current_task:
+                return next((url for url in extracted_urls
+                             if url and (url.startswith('http') or url.startswith('/'))),
+                            None)
+
             # Filter out javascript:void(0) and other non-navigable URLs
-            valid_urls = [url for url in extracted_urls if url 
+            valid_urls = [url for url in extracted_urls if url
                           and not url.startswith('javascript:')
                           and url != '#'
                           and url != '']
-                          
-            # If we have a task, use LLM to pick the most relevant URL
-            if current_task and len(valid_urls) > 0:
+
+            # Use LLM to pick the most relevant URL for the task
+            if valid_urls:
                 relevant_url = self._extract_relevant_url(valid_urls, current_task)
                 if relevant_url:
                     return relevant_url
-            
+
             # Return the first valid URL found if we couldn't get a relevant one
             for url in valid_urls:
-                if url and (url.startswith('http') or url.startswith('/')):
+                if url.startswith('http') or url.startswith('/'):
                     return url
-                    
+
             if not valid_urls:
                 logger.warning(f"No valid URLs found in any matching elements for selector: {selector}")
-                
+
             return None
         except Exception as e:
             logger.error(f"Error extracting URL: {str(e)}")
-            self.action_history.append(f"Error extracting URL: {e}")
             return None
     
-    def _try_click_strategies(self, selector, max_attempts=3, current_task=None):
-        """Try multiple strategies to click an element"""
+    def _try_click_strategies(self, selector, max_attempts=3, current_task=None,
+                               current_url=None):
+        """Try multiple strategies to click an element
+
+        current_url lets the caller pass in an already-fetched URL; each
+        driver.current_url read is a full WebDriver round-trip.
+        """
         from selenium.webdriver.common.action_chains import ActionChains
         from selenium.webdriver.support import expected_conditions as EC
         from selenium.webdriver.support.ui import WebDriverWait
         from selenium.common.exceptions import ElementClickInterceptedException, TimeoutException
         
+        if current_url is None:
+            current_url = self.driver.current_url
+
         logger.info(f"🔍 Attempting to interact with element: {selector}")
         
         # First validate and possibly improve the selector
@@ -534,18 +942,16 @@ Do NOT include any explanation or additional text in your response.
         target_url = self._extract_url_from_element(selector, current_task)
         if target_url:
             logger.info(f"🌐 FOUND TARGET URL: {target_url}")
-            self.action_history.append(f"Element has URL: {target_url}")
+            self._record_action(f"Element has URL: {target_url}")
             
             # Try direct navigation as the FIRST strategy if we have a URL
             if target_url.startswith('http') or target_url.startswith('/'):
                 logger.info(f"🚀 STRATEGY: Direct navigation to extracted URL: {target_url}")
                 try:
-                    current_url = self.driver.current_url
                     full_url = target_url
                     
                     # Handle relative URLs
                     if target_url.startswith('/'):
-                        from urllib.parse import urlparse
                         parsed = urlparse(current_url)
                         base_url = f"{parsed.scheme}://{parsed.netloc}"
                         full_url = base_url + target_url
@@ -593,7 +999,7 @@ Do NOT include any explanation or additional text in your response.
         
         # Try each selector with each strategy
         for attempt_selector in selectors_to_try:
-            by = By.XPATH if attempt_selector.startswith('//') else By.CSS_SELECTOR
+            by, _ = self._classify_selector(attempt_selector)
             logger.info(f"Attempting with selector: {attempt_selector}")
             
             # Also extract URL from alternative selectors
@@ -606,8 +1012,7 @@ Do NOT include any explanation or additional text in your response.
                         try:
                             # Handle relative URLs
                             if alt_url.startswith('/'):
-                                from urllib.parse import urlparse
-                                parsed = urlparse(self.driver.current_url)
+                                parsed = urlparse(current_url)
                                 base_url = f"{parsed.scheme}://{parsed.netloc}"
                                 full_url = base_url + alt_url
                                 logger.info(f"Converting relative URL to absolute: {full_url}")
@@ -619,89 +1024,147 @@ Do NOT include any explanation or additional text in your response.
                         except Exception as e:
                             logger.warning(f"⚠️ Navigation to alternative URL failed: {str(e)}")
             
-            # Take a screenshot before clicking to compare later
+            # Take a screenshot before clicking to compare later; decode it
+            # on a worker thread while we get on with the click itself
             before_screenshot = self.screenshot()
+            before_decoded = self._decode_pool.submit(self._decode_for_compare, before_screenshot)
             
-            # STRATEGY 1: Find all matching elements and try clicking each one
+            # STRATEGY 1: batched in-page click of every matching element.
+            # Visibility checks, clicks, and change detection all happen in a
+            # single execute_async_script instead of a Python loop paying
+            # per-element round trips and per-element waits. querySelectorAll
+            # can't evaluate XPath, so those go straight to strategy 2.
+            if by == By.CSS_SELECTOR:
+                try:
+                    logger.info(f"🖱️ STRATEGY: Batched JavaScript click of elements matching {attempt_selector}")
+                    result = self.driver.execute_async_script("""
+                        var selector = arguments[0];
+                        var done = arguments[arguments.length - 1];
+                        var urlBefore = location.href;
+                        var bodyLenBefore = document.documentElement.outerHTML.length;
+                        var elements = document.querySelectorAll(selector);
+                        var results = [];
+                        for (var i = 0; i < elements.length; i++) {
+                            var visible = elements[i].offsetParent !== null;
+                            var clicked = false;
+                            if (visible) {
+                                try {
+                                    elements[i].scrollIntoView({block: 'center'});
+                                    elements[i].click();
+                                    clicked = true;
+                                } catch (e) {
+                                    console.error('Click error:', e);
+                                }
+                            }
+                            results.push({index: i, visible: visible, clicked: clicked});
+                        }
+                        setTimeout(function() {
+                            done({
+                                results: results,
+                                urlBefore: urlBefore,
+                                urlAfter: location.href,
+                                bodyLenBefore: bodyLenBefore,
+                                bodyLenAfter: document.documentElement.outerHTML.length
+                            });
+                        }, 500);
+                    """, attempt_selector)
+
+                    clicked_count = sum(1 for r in result['results'] if r['clicked'])
+                    logger.info(f"Batched click: {len(result['results'])} matches, "
+                                f"{clicked_count} visible elements clicked")
+
+                    if clicked_count > 0:
+                        # Cheap in-page signals first - no second screenshot needed
+                        if result['urlAfter'] != result['urlBefore']:
+                            logger.info(f"✅ URL changed to {result['urlAfter']} after JavaScript click")
+                            return True
+                        if result['bodyLenAfter'] != result['bodyLenBefore']:
+                            logger.info("✅ DOM changed after JavaScript click")
+                            return True
+
+                        # Inconclusive - fall back to the screenshot oracle
+                        after_screenshot = self.screenshot()
+                        if self._compare_decoded(before_decoded.result(),
+                                                 self._decode_for_compare(after_screenshot)):
+                            logger.info("✅ Page visually changed after JavaScript click")
+                            return True
+                        elif self.driver.current_url != current_url:
+                            logger.info(f"✅ URL changed to {self.driver.current_url} after JavaScript click")
+                            return True
+                except Exception as e:
+                    logger.warning(f"JavaScript click error: {e}")
+                    # Only treat the error as a successful click when the click
+                    # itself destroyed the script context by navigating; a
+                    # pre-click evaluation error never clicked anything
+                    msg = str(e).lower()
+                    destroyed = any(marker in msg for marker in
+                                    ('document unloaded', 'context was destroyed',
+                                     'execution context'))
+                    if destroyed and self.driver.current_url != current_url:
+                        logger.info(f"✅ URL changed to {self.driver.current_url} after JavaScript click")
+                        return True
+
+            # STRATEGY 2: elements living in iframes or shadow roots are
+            # invisible to the main-document querySelectorAll above; click
+            # those through the WebElement handles from the comprehensive
+            # search, one fused scroll+click per displayed element.
             elements = self._check_element_exists(attempt_selector)
             if elements:
                 try:
                     logger.info(f"🖱️ STRATEGY: Found {len(elements)} matching elements, attempting clicks")
-                    
                     for i, element in enumerate(elements):
                         try:
-                            # Check if element is visible and clickable
-                            if element.is_displayed():
-                                logger.info(f"Element {i+1} is displayed, attempting to click")
-                                # Scroll to element
-                                self.driver.execute_script("arguments[0].scrollIntoView({block: 'center', behavior: 'smooth'});", element)
-                                time.sleep(0.5)
-                                
-                                # Try regular click
-                                logger.info(f"Attempting direct click on element {i+1}")
+                            if not element.is_displayed():
+                                logger.info(f"Element {i+1} is not displayed, skipping")
+                                continue
+                            logger.info(f"Element {i+1} is displayed, attempting to click")
+                            mut_token = self._mutation_token()
+                            try:
+                                self.driver.execute_script(
+                                    "return window.__scrollClick(arguments[0]);", element)
+                                logger.info(f"Fused scroll+click successful on element {i+1}")
+                            except Exception as e:
+                                logger.debug(f"Fused scroll+click failed ({e}), using direct click")
+                                self.driver.execute_script(
+                                    "arguments[0].scrollIntoView({block: 'center'});", element)
                                 element.click()
                                 logger.info(f"Direct click successful on element {i+1}")
-                                time.sleep(1)
-                                
-                                # Check if page changed
+                            time.sleep(1)
+
+                            # Check if page changed - URL and the page's
+                            # mutation counter are far cheaper signals than a
+                            # screenshot diff
+                            if self.driver.current_url != self.current_url:
+                                logger.info(f"✅ URL changed to {self.driver.current_url} after click")
+                                return True
+                            changed = self._page_changed_since(mut_token)
+                            if changed:
+                                logger.info("✅ DOM mutated after click")
+                                return True
+                            if changed is None:
+                                # No mutation counter - fall back to the
+                                # screenshot oracle
                                 after_screenshot = self.screenshot()
-                                if self._compare_screenshots(before_screenshot, after_screenshot):
+                                if self._compare_decoded(before_decoded.result(),
+                                                         self._decode_for_compare(after_screenshot)):
                                     logger.info("✅ Page visually changed after click")
                                     return True
-                                elif self.driver.current_url != self.current_url:
-                                    logger.info(f"✅ URL changed to {self.driver.current_url} after click")
-                                    return True
-                                
-                                logger.info("Page didn't change, trying next element")
-                            else:
-                                logger.info(f"Element {i+1} is not displayed, skipping")
+
+                            logger.info("Page didn't change, trying next element")
                         except Exception as e:
                             logger.warning(f"Error clicking element {i+1}: {e}")
                 except Exception as e:
                     logger.warning(f"Error during element click attempts: {e}")
             else:
                 logger.warning(f"No elements found with our comprehensive search")
-            
-            # STRATEGY 2: JavaScript click all matching elements
-            try:
-                logger.info(f"🖱️ STRATEGY: JavaScript click all matching elements with {attempt_selector}")
-                # Execute JavaScript to click all matching elements
-                result = self.driver.execute_script(f"""
-                    var elements = document.querySelectorAll("{attempt_selector}");
-                    var clickCount = 0;
-                    for(var i=0; i<elements.length; i++) {{
-                        try {{
-                            elements[i].scrollIntoView({{block: 'center'}});
-                            elements[i].click();
-                            clickCount++;
-                        }} catch(e) {{
-                            console.error("Click error:", e);
-                        }}
-                    }}
-                    return clickCount;
-                """)
-                logger.info(f"JavaScript executed, clicked {result} elements")
-                
-                # Check if page changed
-                time.sleep(1)
-                after_screenshot = self.screenshot()
-                if self._compare_screenshots(before_screenshot, after_screenshot):
-                    logger.info("✅ Page visually changed after JavaScript click")
-                    return True
-                elif self.driver.current_url != self.current_url:
-                    logger.info(f"✅ URL changed to {self.driver.current_url} after JavaScript click")
-                    return True
-            except Exception as e:
-                logger.warning(f"JavaScript click error: {e}")
-        
+
         # If we have a URL, try navigating directly as a final fallback
         if target_url:
             logger.info(f"🔄 All click strategies failed, trying final direct navigation to: {target_url}")
             try:
                 # Handle relative URLs
                 if target_url.startswith('/'):
-                    from urllib.parse import urlparse
-                    parsed = urlparse(self.driver.current_url)
+                    parsed = urlparse(current_url)
                     base_url = f"{parsed.scheme}://{parsed.netloc}"
                     full_url = base_url + target_url
                     logger.info(f"Converting relative URL to absolute: {full_url}")
@@ -718,10 +1181,9 @@ Do NOT include any explanation or additional text in your response.
 
     def perform_action(self, action, selector=None, amount=None, current_task=None):
         """Perform browser actions using Selenium"""
-        # Add delay between actions (1-3 seconds)
-        delay = random.uniform(1, 3)
-        logger.info(f"Waiting {delay:.1f} seconds before next action")
-        time.sleep(delay)
+        if self.min_action_delay:
+            logger.info(f"Waiting {self.min_action_delay:.1f} seconds before next action")
+            time.sleep(self.min_action_delay)
         
         try:
             if action == "hover" and selector:
@@ -733,62 +1195,78 @@ Do NOT include any explanation or additional text in your response.
                 element = self._wait_for_element(selector)
                 if element is None:
                     logger.error(f"Failed to find element for hover: {selector}")
-                    self.action_history.append(f"Failed to find element for hover: {selector}")
+                    self._record_action(f"Failed to find element for hover: {selector}")
                     return False
                 
                 # Hover over element
                 from selenium.webdriver.common.action_chains import ActionChains
                 actions = ActionChains(self.driver)
                 actions.move_to_element(element).perform()
-                self.action_history.append(f"Hovered over element: {selector}")
+                self._record_action(f"Hovered over element: {selector}")
                 logger.info(f"Successfully hovered over element: {selector}")
                 
-                # Give some time for hover effects to appear
+                # Poll for hover effects at 100ms instead of sleeping out a
+                # fixed 1.5s ceiling - most hover menus appear immediately
                 logger.info("Waiting for hover effects to appear")
-                time.sleep(1.5)
-                
-                # Take another screenshot and compare
-                after_screenshot = self.screenshot()
-                
+                hover_changed = False
+                deadline = time.monotonic() + 1.5
+                while True:
+                    after_screenshot = self.screenshot()
+                    if self._compare_screenshots(before_screenshot, after_screenshot):
+                        hover_changed = True
+                        break
+                    if time.monotonic() >= deadline:
+                        break
+                    time.sleep(0.1)
+
                 # Check if the hover caused visible changes
-                if self._compare_screenshots(before_screenshot, after_screenshot):
+                if hover_changed:
                     logger.info("Hover action caused visible changes")
-                    self.action_history.append("Hover action caused visible changes")
+                    self._record_action("Hover action caused visible changes")
                     return True
                 else:
                     logger.info("Hover action did not cause visible changes")
-                    self.action_history.append("Hover action did not cause visible changes")
+                    self._record_action("Hover action did not cause visible changes")
                     # If no changes, try clicking if it's a navigation element
                     target_url = self._extract_url_from_element(selector, current_task)
                     if target_url:
                         logger.info(f"Element has URL: {target_url}, clicking after hover")
-                        self.action_history.append(f"Element has URL: {target_url}, clicking after hover")
+                        self._record_action(f"Element has URL: {target_url}, clicking after hover")
                         return self.perform_action("click", selector=selector, current_task=current_task)
                     return True
                 
             elif action == "click" and selector:
                 logger.info(f"Clicking element: {selector}")
-                # Store current URL before clicking
+                # Read the URL once and thread it through the click
+                # strategies; each read is a WebDriver round-trip
                 current_url = self.driver.current_url
                 
                 # Try multiple approaches to find and click the element
-                success = self._try_click_strategies(selector, current_task=current_task)
+                success = self._try_click_strategies(selector, current_task=current_task,
+                                                     current_url=current_url)
                 
                 if not success:
                     logger.error(f"All click strategies failed for: {selector}")
-                    self.action_history.append(f"All click strategies failed for: {selector}")
+                    self._record_action(f"All click strategies failed for: {selector}")
                     return False
                 
-                # Wait a moment for any page loads/AJAX
+                # Wait for the click to take effect: either the URL changes
+                # or the (possibly new) document finishes loading
                 logger.info("Waiting for page to process click")
-                time.sleep(2)
+                try:
+                    WebDriverWait(self.driver, 5).until(
+                        lambda d: d.current_url != current_url
+                        or d.execute_script('return document.readyState') == 'complete'
+                    )
+                except TimeoutException:
+                    logger.warning("Page did not settle within 5s after click")
                 
                 # Check if URL changed (navigation occurred)
                 new_url = self.driver.current_url
                 if new_url != current_url:
                     self.current_url = new_url
                     logger.info(f"Navigation occurred to: {new_url}")
-                    self.action_history.append(f"Navigation occurred to: {new_url}")
+                    self._record_action(f"Navigation occurred to: {new_url}")
                     
                     # Wait for the page to stabilize
                     self._wait_for_page_load()
@@ -797,17 +1275,24 @@ Do NOT include any explanation or additional text in your response.
                 
             elif action == "scroll" and amount:
                 logger.info(f"Scrolling page by {amount} pixels")
-                # Execute JavaScript to scroll
+                # Execute JavaScript to scroll, then wait for the offset to
+                # actually move rather than sleeping a fixed half second
+                offset_before = self.driver.execute_script("return window.pageYOffset;")
                 self.driver.execute_script(f"window.scrollBy(0, {amount});")
-                self.action_history.append(f"Scrolled page by {amount} pixels")
-                time.sleep(0.5)
+                self._record_action(f"Scrolled page by {amount} pixels")
+                try:
+                    WebDriverWait(self.driver, 1, poll_frequency=0.05).until(
+                        lambda d: d.execute_script("return window.pageYOffset;") != offset_before
+                    )
+                except TimeoutException:
+                    # Already at the top/bottom of the page - nothing to wait for
+                    pass
                 return True
                 
             return False
             
         except Exception as e:
             logger.error(f"Action failed: {action} - {str(e)}")
-            self.action_history.append(f"Action failed: {action} - {str(e)}")
             return False
     
     def _wait_for_page_load(self, timeout=10):
@@ -818,29 +1303,24 @@ Do NOT include any explanation or additional text in your response.
             WebDriverWait(self.driver, timeout).until(
                 lambda d: d.execute_script('return document.readyState') == 'complete'
             )
-            
-            # Give a moment for any animations to settle
-            time.sleep(1)
             logger.info("Page load complete")
             return True
         except Exception as e:
             logger.error(f"Error waiting for page to load: {e}")
-            self.action_history.append(f"Error waiting for page to load: {e}")
             return False
     
     def _wait_for_element(self, selector, timeout=5):
         """Wait for element to be present and return it"""
         try:
             logger.debug(f"Waiting for element: {selector}")
-            # Determine if selector is XPath or CSS
-            if selector.startswith('//'):
-                element = WebDriverWait(self.driver, timeout).until(
-                    EC.presence_of_element_located((By.XPATH, selector))
-                )
+            by, _ = self._classify_selector(selector)
+            # Reuse the shared wait for the default timeout instead of
+            # allocating a WebDriverWait per call
+            if timeout == 5:
+                wait = self._wait
             else:
-                element = WebDriverWait(self.driver, timeout).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                )
+                wait = WebDriverWait(self.driver, timeout, poll_frequency=0.2)
+            element = wait.until(EC.presence_of_element_located((by, selector)))
             logger.debug(f"Element found: {selector}")
             return element
         except TimeoutException:
@@ -848,76 +1328,218 @@ Do NOT include any explanation or additional text in your response.
             return None
         except Exception as e:
             logger.error(f"Error waiting for element: {e}")
-            self.action_history.append(f"Error waiting for element: {e}")
             return None
     
+    def snapshot(self):
+        """Capture the current screenshot and serialized DOM together
+
+        Every decision step needs both; fusing them means callers running
+        driver work on a background executor schedule one unit instead of
+        two, and both CDP commands ride the same DevTools connection
+        back-to-back.
+        """
+        return self.screenshot(), self.get_html()
+
     def get_html(self):
         """Get the HTML content of the page"""
         logger.debug("Getting page HTML content")
-        return self.driver.page_source
+        cache_key = (self.driver.current_url, self._action_seq)
+        if self._html_cache is not None and self._html_cache[0] == cache_key:
+            logger.debug("Returning cached page HTML")
+            return self._html_cache[1]
+        try:
+            # CDP hands back the serialized DOM without the JSON wire
+            # encoding overhead that page_source pays
+            result = self.driver.execute_cdp_cmd('Runtime.evaluate', {
+                'expression': 'document.documentElement.outerHTML',
+                'returnByValue': True
+            })
+            html = result['result']['value']
+        except Exception as e:
+            logger.warning(f"CDP HTML fetch failed, falling back to page_source: {e}")
+            html = self.driver.page_source
+        self._html_cache = (cache_key, html)
+        return html
     
-    def get_ai_decision(self, html_content, conversation_history):
-        """Use GPT-4o to decide the next action"""
-        time.sleep(1)
-        logger.info("Requesting next action from AI model")
+    # Tokenizer shared across calls; encoding_for_model is not free
+    _prompt_encoder = None
+
+    def _truncate_html_for_prompt(self, html_content, max_tokens=6000):
+        """Strip non-semantic markup and cut the page HTML to a token budget
+
+        A plain character slice wastes the budget on scripts/styles and can
+        still blow the model's context on token-dense pages; cutting on
+        actual token counts is both tighter and safer.
+        """
+        if self._truncate_cache is not None:
+            cached_input, cached_budget, cached_output = self._truncate_cache
+            if cached_budget == max_tokens and cached_input == html_content:
+                return cached_output
+
+        cleaned = _HTML_NOISE_RE.sub('', html_content)
+        cleaned = _DATA_URI_RE.sub('', cleaned)
+        cleaned = _WS_RE.sub(' ', cleaned)
+
+        if BrowserAgent._prompt_encoder is None and tiktoken is not None:
+            try:
+                BrowserAgent._prompt_encoder = tiktoken.encoding_for_model('gpt-4o')
+            except KeyError:
+                # tiktoken release predates the model name; its tokenizer
+                # family is a close-enough budget estimate
+                try:
+                    BrowserAgent._prompt_encoder = tiktoken.get_encoding('cl100k_base')
+                except Exception:
+                    pass
+
+        if BrowserAgent._prompt_encoder is None:
+            # No tokenizer available - fall back to the old character cut,
+            # applied after stripping so the budget buys useful markup
+            result = cleaned[:8000] + "..." if len(cleaned) > 8000 else cleaned
+        else:
+            tokens = BrowserAgent._prompt_encoder.encode(cleaned)
+            if len(tokens) <= max_tokens:
+                result = cleaned
+            else:
+                result = BrowserAgent._prompt_encoder.decode(tokens[:max_tokens]) + "..."
+
+        self._truncate_cache = (html_content, max_tokens, result)
+        return result
+
+    # Messages kept from the tail of the conversation when trimming; the
+    # system primer and the original task message are always retained
+    _HISTORY_TAIL = 8
+
+    @classmethod
+    def _trim_history(cls, conversation_history):
+        """Bound the conversation re-sent with every decision call
+
+        Old step transcripts add upload bytes and prompt tokens on each
+        call but rarely change the decision; the recent-actions summary in
+        the prompt already covers what happened. Keep the first two
+        messages (system primer + task) and the last few exchanges.
+        """
+        if len(conversation_history) <= 2 + cls._HISTORY_TAIL:
+            return conversation_history
+        return conversation_history[:2] + conversation_history[-cls._HISTORY_TAIL:]
+
+    def _decision_messages(self, html_content, conversation_history):
+        """Assemble the message list for a next-action decision"""
+        conversation_history = self._trim_history(conversation_history)
         # Get latest screenshot as base64 for prompt
         screenshot_base64 = self.get_screenshot_base64()
         
         # Truncate HTML to avoid token limits
-        html_truncated = html_content[:8000] + "..." if len(html_content) > 8000 else html_content
+        html_truncated = self._truncate_html_for_prompt(html_content)
         
         # Get current URL
         current_url = self.driver.current_url
         
         # Prepare history summary - limit to last 10 actions
-        action_summary = "\n".join(self.action_history[-10:]) if self.action_history else "No actions taken yet."
+        if self.action_history:
+            action_summary = "\n".join(
+                islice(self.action_history, max(0, len(self.action_history) - 10), None))
+        else:
+            action_summary = "No actions taken yet."
+        
+        # The prompt tells the model a screenshot is attached, so attach it:
+        # vision content blocks require a user-role message with a parts list
+        content = [{
+            "type": "text",
+            "text": _DECISION_PROMPT(
+                url=current_url,
+                actions=action_summary,
+                html=html_truncated)
+        }]
+        if screenshot_base64:
+            content.append({
+                "type": "image_url",
+                "image_url": {"url": f"data:image/jpeg;base64,{screenshot_base64}"}
+            })
+        return conversation_history + [{"role": "user", "content": content}]
+
+    def get_ai_decision(self, html_content, conversation_history):
+        """Use GPT-4o to decide the next action"""
+        time.sleep(1)
+        logger.info("Requesting next action from AI model")
+        messages = self._decision_messages(html_content, conversation_history)
         
         logger.info("Sending request to OpenAI for next action decision")
         response = client.chat.completions.create(
             model="gpt-4o",
-            messages=conversation_history + [{
-                "role": "system",
-                "content": f"""
-Current URL: {current_url}
-Recent Actions:
-{action_summary}
-
-Current HTML (truncated):
-{html_truncated}
-
-I've attached a screenshot of the current state of the webpage.
-
-Based on the screenshot, HTML content, and previous actions, determine the next best action to complete the user's task.
-
-NAVIGATION MENU STRATEGY:
-For navigation menu items, ALWAYS try hovering first before clicking, as many menus reveal options on hover.
-If you've already hovered over an element and saw no changes, then try clicking it.
-
-Available actions:
-1. Hover: Identify an element to hover over (provide CSS selector or XPath) - Example: "action: hover, selector: .dropdown-menu"
-2. Click: Identify a specific element to click (provide CSS selector or XPath) - Example: "action: click, selector: #submit-button"
-3. Scroll: Scroll the page to see more content (specify amount in pixels, positive for down, negative for up) - Example: "action: scroll, amount: 500"
-4. Complete: If you believe the task is complete - Example: "action: complete"
-
-For hover and click actions, analyze the HTML to provide the EXACT CSS selector or XPath for the element.
-Be specific and ensure your action directly contributes to the task.
-
-Return your decision in a consistent format:
-action: [action type]
-selector: [CSS selector or XPath for the element] (only for click/hover)
-amount: [scroll amount in pixels] (only for scroll)
-reasoning: [brief explanation of why this action]
-"""
-            }],
+            messages=messages,
             max_tokens=1500
         )
         logger.info("Received AI model response")
         return response.choices[0].message.content
+
+    def get_ai_decision_stream(self, html_content, conversation_history):
+        """Stream the next-action decision, yielding text chunks as they arrive
+
+        Same prompt and model as get_ai_decision; the total latency is
+        unchanged but the first tokens show up after one network round-trip
+        instead of after the whole completion.
+        """
+        logger.info("Requesting next action from AI model (streaming)")
+        messages = self._decision_messages(html_content, conversation_history)
+        
+        stream = client.chat.completions.create(
+            model="gpt-4o",
+            messages=messages,
+            max_tokens=1500,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        logger.info("AI model stream finished")
     
+    def get_ai_batch(self, prompts, conversation_history=None):
+        """Answer several independent prompts with one chat completion
+
+        The chat completions API takes a single message thread per request,
+        so there is no true multi-prompt batch; the prompts are numbered
+        into one user message and the reply is split back out by index.
+        Shared context is paid for once and N-1 network round-trips are
+        saved versus issuing the prompts separately.
+        """
+        if not prompts:
+            return []
+        
+        numbered = "\n\n".join(
+            f"### Prompt {i}\n{prompt}" for i, prompt in enumerate(prompts, 1))
+        messages = list(conversation_history or []) + [{
+            "role": "user",
+            "content": (
+                f"Answer each of the following {len(prompts)} prompts "
+                "independently. Begin each answer with a line of the form "
+                "'### Answer <number>' matching the prompt number.\n\n"
+                + numbered)
+        }]
+        
+        logger.info(f"Sending batched request with {len(prompts)} prompts to OpenAI")
+        response = client.chat.completions.create(
+            model="gpt-4o",
+            messages=messages,
+            max_tokens=1500
+        )
+        text = response.choices[0].message.content
+        
+        answers = [""] * len(prompts)
+        parts = _BATCH_ANSWER_RE.split(text)
+        # parts alternates [preamble, index, body, index, body, ...]
+        for index_str, body in zip(parts[1::2], parts[2::2]):
+            index = int(index_str) - 1
+            if 0 <= index < len(answers):
+                answers[index] = body.strip()
+        return answers
+
     def close(self):
         """Close the browser"""
         try:
             logger.info("Closing browser")
+            self._decode_pool.shutdown(wait=False)
             self.driver.quit()
             logger.info("Browser closed successfully")
         except:
@@ -933,12 +1555,15 @@ reasoning: [brief explanation of why this action]
             return body_content
         except Exception as e:
             logger.error(f"Error extracting body content: {e}")
-            self.action_history.append(f"Error extracting body content: {e}")
-            # Fallback to regexp if execute_script fails
+            # Fallback: slice out the body with find/rfind - linear, with
+            # no DOTALL backtracking over megabytes of HTML
             html = self.get_html()
-            body_match = re.search(r"<body[^>]*>(.*?)</body>", html, re.DOTALL)
-            if body_match:
-                return body_match.group(1)
+            start = html.find('<body')
+            if start != -1:
+                start = html.find('>', start)
+                end = html.rfind('</body>')
+                if start != -1 and end > start:
+                    return html[start + 1:end]
             return html  # Return full HTML as fallback
     
     def save_page_content(self, filename=None):
@@ -948,18 +1573,20 @@ reasoning: [brief explanation of why this action]
         
         if not filename:
             # Generate filename based on current URL and timestamp
-            import datetime
-            clean_url = self.current_url.replace('https://', '').replace('http://', '').replace('/', '_')
+            clean_url = _URL_SCHEME_RE.sub('', self.current_url).replace('/', '_')
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"page_content_{clean_url}_{timestamp}.html"
         
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(body_content)
+            # Encode and write in 64KB slices; a single write of a multi-MB
+            # page would materialize one more full copy of it (the encoded
+            # bytes) on top of the string the JS return already allocated
+            with open(filename, 'wb') as f:
+                for i in range(0, len(body_content), 65536):
+                    f.write(body_content[i:i + 65536].encode('utf-8', 'replace'))
             logger.info(f"Successfully saved body content to {filename}")
-            self.action_history.append(f"Saved body content to {filename}")
+            self._record_action(f"Saved body content to {filename}")
             return filename
         except Exception as e:
             logger.error(f"Error saving body content: {e}")
-            self.action_history.append(f"Error saving body content: {e}")
             return None 
\ No newline at end of file
@@ -1,8 +1,10 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 import json
+import orjson
 import os
 import time
+from dataclasses import dataclass
 from dotenv import load_dotenv
 import asyncio
 import logging
@@ -27,9 +29,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# State for one active WebSocket connection. Slots avoid a per-instance
+# __dict__ and make field access a fixed-offset load instead of a
+# string-hashed dict lookup. Idleness is enforced by the per-connection
+# timer task, so no activity timestamp is tracked here.
+@dataclass(slots=True)
+class Conn:
+    websocket: WebSocket
+    browser_agent: BrowserAgent
+
+
 # Store active WebSocket connections and their browser agents
 active_connections = {}
 
+# Close connections with no client activity for this long (seconds)
+IDLE_TIMEOUT = 600
+
 @app.get("/")
 async def read_root():
     return {"status": "AI Web Browsing Agent API is running"}
@@ -51,7 +66,26 @@ async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     connection_id = id(websocket)
     browser_agent = None
-    
+    idle_task = None
+
+    # Per-connection idle timer: sleeps for the full idle budget and closes
+    # the socket if it ever fires. Each received message cancels and restarts
+    # it, so enforcement is exact and costs nothing while connections are
+    # active (no periodic sweep waking the event loop).
+    async def _idle_killer():
+        await asyncio.sleep(IDLE_TIMEOUT)
+        logger.info(f"Closing inactive connection (id: {connection_id})")
+        try:
+            await websocket.close(code=1000, reason="Inactive connection")
+        except Exception:
+            pass
+
+    def _reset_idle_timer():
+        nonlocal idle_task
+        if idle_task is not None:
+            idle_task.cancel()
+        idle_task = asyncio.create_task(_idle_killer())
+
     try:
         # Check if we have too many connections
         if len(active_connections) >= 10:  # Arbitrary limit to prevent resource exhaustion
@@ -61,21 +95,26 @@ async def websocket_endpoint(websocket: WebSocket):
         
         # Add connection to active connections
         browser_agent = BrowserAgent()
-        active_connections[connection_id] = {
-            "websocket": websocket,
-            "browser_agent": browser_agent,
-            "last_activity": time.time()
-        }
+        active_connections[connection_id] = Conn(
+            websocket=websocket,
+            browser_agent=browser_agent
+        )
         
+        _reset_idle_timer()
+
         logger.info(f"WebSocket connection established (id: {connection_id})")
         logger.info(f"Total active connections: {len(active_connections)}")
         
-        # Send initial connection confirmation
-        await websocket.send_json({
+        # Send initial connection confirmation. All outbound payloads are
+        # serialised with orjson - markedly faster than stdlib json for the
+        # big base64 screenshot strings - but shipped as text frames: the
+        # React client JSON.parses event.data directly and would receive
+        # binary frames as Blobs.
+        await websocket.send_text(orjson.dumps({
             "type": "status",
             "status": "Connected",
             "timestamp": time.time()
-        })
+        }).decode())
         
         while True:
             # Add a small timeout to prevent CPU spinning
@@ -83,50 +122,81 @@ async def websocket_endpoint(websocket: WebSocket):
                 data = await asyncio.wait_for(websocket.receive_text(), timeout=60.0)
             except asyncio.TimeoutError:
                 # Send a ping to keep the connection alive
-                await websocket.send_json({
-                    "type": "ping", 
+                await websocket.send_text(orjson.dumps({
+                    "type": "ping",
                     "timestamp": time.time()
-                })
+                }).decode())
                 continue
                 
-            active_connections[connection_id]["last_activity"] = time.time()
+            _reset_idle_timer()
             logger.info(f"Received message of size: {len(data)} bytes")
             
             try:
                 task_data = json.loads(data)
-                task = BrowsingTask(**task_data)
+                task = BrowsingTask.model_validate(task_data)
             except Exception as e:
                 logger.error(f"Invalid task data: {str(e)}")
-                await websocket.send_json({
+                await websocket.send_text(orjson.dumps({
                     "type": "error",
                     "message": f"Invalid task data: {str(e)}",
                     "timestamp": time.time()
-                })
+                }).decode())
                 continue
             
             logger.info(f"Starting browsing task for URL: {task.url}")
             
-            # Handle the browsing session
-            async for update in browser_agent.execute_task(task.url, task.instruction):
+            # Handle the browsing session. Updates go through a bounded queue
+            # drained by a dedicated sender task, so network sends overlap
+            # with the next Selenium action instead of serializing behind it;
+            # the queue bound gives natural backpressure when the client lags.
+            send_queue = asyncio.Queue(maxsize=8)
+
+            async def _send_update(update):
                 try:
                     # Log the size of each message type we're sending
                     if update["type"] == "screenshot":
                         logger.info(f"Sending screenshot update to client, size: {len(update['image_data'])} bytes")
                     else:
                         logger.info(f"Sending {update['type']} update to client")
-                    
+
                     # Use a timeout to prevent hanging on send
-                    send_task = asyncio.create_task(websocket.send_json(update))
-                    await asyncio.wait_for(send_task, timeout=5.0)
-                    
-                    # Small delay to prevent overwhelming the client
-                    await asyncio.sleep(0.1)
-                    
+                    await asyncio.wait_for(
+                        websocket.send_text(orjson.dumps(update).decode()), timeout=5.0)
                 except Exception as e:
                     logger.error(f"Error sending update to client: {str(e)}")
-                    
+
+            async def _drain_updates():
+                pending = None
+                while True:
+                    update = pending if pending is not None else await send_queue.get()
+                    pending = None
+                    if update is None:
+                        break
+                    if update["type"] == "screenshot":
+                        # Only the newest frame matters - coalesce any older
+                        # screenshots that backed up behind a slow send
+                        while not send_queue.empty():
+                            nxt = send_queue.get_nowait()
+                            if nxt is not None and nxt["type"] == "screenshot":
+                                update = nxt
+                            else:
+                                if nxt is None:
+                                    send_queue.put_nowait(None)
+                                else:
+                                    pending = nxt
+                                break
+                    await _send_update(update)
+
+            sender_task = asyncio.create_task(_drain_updates())
+            try:
+                async for update in browser_agent.execute_task(task.url, task.instruction):
+                    await send_queue.put(update)
+            finally:
+                await send_queue.put(None)
+                await sender_task
+
             logger.info("Browsing task completed")
-            active_connections[connection_id]["last_activity"] = time.time()
+            _reset_idle_timer()
     
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected normally (id: {connection_id})")
@@ -134,10 +204,13 @@ async def websocket_endpoint(websocket: WebSocket):
         logger.error(f"WebSocket error: {str(e)}")
         try:
             error_message = {"type": "error", "message": str(e), "timestamp": time.time()}
-            await websocket.send_json(error_message)
+            await websocket.send_text(orjson.dumps(error_message).decode())
         except:
             logger.error("Failed to send error message to client")
     finally:
+        if idle_task is not None:
+            idle_task.cancel()
+
         # Clean up connection resources
         if connection_id in active_connections:
             del active_connections[connection_id]
@@ -152,43 +225,3 @@ async def websocket_endpoint(websocket: WebSocket):
                 logger.info("Browser agent resources cleaned up successfully")
             except Exception as e:
                 logger.error(f"Error cleaning up browser agent: {str(e)}")
-
-# Background task to clean up inactive connections
-@app.on_event("startup")
-async def startup_event():
-    asyncio.create_task(cleanup_inactive_connections())
-
-async def cleanup_inactive_connections():
-    while True:
-        try:
-            current_time = time.time()
-            connection_ids = list(active_connections.keys())
-            
-            for connection_id in connection_ids:
-                connection = active_connections.get(connection_id)
-                if not connection:
-                    continue
-                    
-                # Close connections inactive for more than 10 minutes
-                if current_time - connection["last_activity"] > 600:
-                    logger.info(f"Closing inactive connection (id: {connection_id})")
-                    try:
-                        await connection["websocket"].close(code=1000, reason="Inactive connection")
-                    except:
-                        pass
-                        
-                    if connection_id in active_connections:
-                        try:
-                            await connection["browser_agent"].close()
-                        except:
-                            pass
-                            
-                        del active_connections[connection_id]
-            
-            # Log active connection count once per minute
-            logger.info(f"Active connections: {len(active_connections)}")
-            
-        except Exception as e:
-            logger.error(f"Error in cleanup task: {str(e)}")
-            
-        await asyncio.sleep(60)  # Run cleanup every minute 
\ No newline at end of file
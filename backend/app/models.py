@@ -1,28 +1,37 @@
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, ConfigDict, HttpUrl
 from typing import Optional, Literal, Dict, Any, List
 
 
-class BrowsingTask(BaseModel):
+class _FrozenModel(BaseModel):
+    """Shared config: immutable instances, unknown fields dropped.
+
+    Frozen models are hashable and skip mutation checks; ignoring extras
+    keeps validation of client payloads cheap and forward-compatible.
+    """
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
+
+class BrowsingTask(_FrozenModel):
     """Request model for the browsing task."""
     url: str  # The URL to browse
     instruction: str  # Natural language instruction for what to do on the page
 
 
-class BrowserActionRequest(BaseModel):
+class BrowserActionRequest(_FrozenModel):
     """Request model for browser actions."""
     action_type: Literal["click", "scroll_down", "scroll_up", "screenshot", "get_html"]
     element_selector: Optional[str] = None  # For click actions
     scroll_amount: Optional[int] = None  # For scroll actions, in pixels
 
 
-class ScreenshotUpdate(BaseModel):
+class ScreenshotUpdate(_FrozenModel):
     """Model for screenshot updates."""
     type: Literal["screenshot"] = "screenshot"
     image_data: str  # Base64 encoded image
     timestamp: float
 
 
-class MessageUpdate(BaseModel):
+class MessageUpdate(_FrozenModel):
     """Model for message updates from the agent."""
     type: Literal["message"] = "message"
     content: str
@@ -30,7 +39,7 @@ class MessageUpdate(BaseModel):
     timestamp: float
 
 
-class ActionUpdate(BaseModel):
+class ActionUpdate(_FrozenModel):
     """Model for action updates from the agent."""
     type: Literal["action"] = "action"
     action: str
@@ -38,15 +47,15 @@ class ActionUpdate(BaseModel):
     timestamp: float
 
 
-class StatusUpdate(BaseModel):
+class StatusUpdate(_FrozenModel):
     """Model for status updates from the agent."""
     type: Literal["status"] = "status"
     status: str
     timestamp: float
 
 
-class ErrorUpdate(BaseModel):
+class ErrorUpdate(_FrozenModel):
     """Model for error updates from the agent."""
     type: Literal["error"] = "error"
     message: str
-    timestamp: float 
\ No newline at end of file
+    timestamp: float
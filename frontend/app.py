@@ -2,9 +2,7 @@ import streamlit as st
 import sys
 import os
 import re
-from PIL import Image
-from io import BytesIO
-from openai import OpenAI
+import hashlib
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -13,7 +11,44 @@ load_dotenv()
 # Add backend path explicitly
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from backend.app.browser_agent import BrowserAgent
+# Heavy imports (Selenium, OpenAI, PIL) live inside the cached factories
+# and helpers below: Streamlit re-imports this module on every rerun, and
+# only the first run of a session actually needs to pay for them.
+
+# Every agent the factory has created, keyed by headless setting, so
+# shutdown can close exactly what exists - st.cache_resource.clear()
+# drops entries without closing them, which would leak Chrome processes
+@st.cache_resource
+def _agent_registry():
+    return {}
+
+# Streamlit reruns this script on every widget interaction; cache the agent
+# so Chrome is started once per headless setting, not once per task
+@st.cache_resource
+def get_agent(headless: bool):
+    from backend.app.browser_agent import BrowserAgent
+    agent = BrowserAgent(headless=headless)
+    _agent_registry()[headless] = agent
+    return agent
+
+def shutdown_agents():
+    """Close every created Chrome instance and drop the agent cache"""
+    registry = _agent_registry()
+    for agent in registry.values():
+        try:
+            agent.close()
+        except Exception:
+            pass
+    registry.clear()
+    get_agent.clear()
+
+# Selenium drivers are not thread-safe, so all background driver calls go
+# through this single-worker executor - one dedicated driver thread that
+# lets screenshot/HTML fetches overlap with Streamlit rendering
+@st.cache_resource
+def get_driver_pool():
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="driver")
 
 st.title("Autonomous Web Browsing Agent")
 
@@ -27,72 +62,202 @@ with st.expander("Advanced Options", expanded=False):
     
     st.info("Using undetected_chromedriver to bypass bot detection. Showing the browser (headless=False) may help with sites that have advanced anti-bot measures.")
 
-# Get API key from loaded environment variables
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    hd_screenshots = st.checkbox("HD screenshots", value=False,
+                                 help="Show full-resolution screenshots. When off, screenshots are downscaled and re-encoded as WebP for a much lighter page.")
+
+    if st.button("Shutdown browser", help="Close the cached Chrome instances and free their resources"):
+        shutdown_agents()
+        st.success("Browser shut down.")
+
+# One OpenAI client per server process; reruns reuse its connection pool
+# instead of rebuilding the httpx client and TLS context each time
+@st.cache_resource
+def get_openai():
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+client = get_openai()
 
 # Initialize session state if not already done
 if "action_history" not in st.session_state:
     st.session_state.action_history = []
+# Task progress survives reruns: any widget interaction mid-task reruns the
+# whole script, and without this the completed LLM steps would be lost
+st.session_state.setdefault("conversation_history", [])
+st.session_state.setdefault("step", 0)
+
+# Function to shrink screenshots for display
+def prepare_display_image(screenshot_bytes, hd=False):
+    """Downscale a screenshot to display width and re-encode as WebP.
+
+    Full-viewport captures are multi-hundred-KB each and the loop shows up
+    to ten of them; a 1024px WebP is a fraction of the size over the
+    Streamlit websocket. With hd=True the original bytes pass through
+    untouched (no decode, no re-encode).
+    """
+    if hd:
+        return screenshot_bytes
+    try:
+        from io import BytesIO
+        from PIL import Image
+        img = Image.open(BytesIO(screenshot_bytes))
+        if img.width <= 1024:
+            return screenshot_bytes
+        img.thumbnail((1024, 1024))
+        buf = BytesIO()
+        img.save(buf, 'WEBP', quality=80)
+        return buf.getvalue()
+    except Exception:
+        return screenshot_bytes
+
+# Fields the AI is asked to return, one per line (see the decision prompt)
+_RESPONSE_KEYS = {"action", "selector", "amount", "reasoning"}
+
+# Fallbacks for fields the line pass misses when the model packs several
+# onto one line ("action: click, selector: #submit-button" - the format
+# the prompt's own examples show)
+_INLINE_RES = {
+    "action": re.compile(r'action:\s*(\w+)', re.IGNORECASE),
+    "selector": re.compile(r'selector:\s*([^\n]+)', re.IGNORECASE),
+    "amount": re.compile(r'amount:\s*(-?\d+)', re.IGNORECASE),
+    "reasoning": re.compile(r'reasoning:\s*([^\n]+)', re.IGNORECASE),
+}
+_INLINE_STOP_RE = re.compile(r',\s*(?:amount|reasoning):', re.IGNORECASE)
 
 # Function to parse AI response
 def parse_ai_response(response_text):
+    """Parse the AI's key: value response lines in a single pass."""
     result = {}
-    # Extract action type
-    action_match = re.search(r'action:\s*(\w+)', response_text, re.IGNORECASE)
-    if action_match:
-        result["action"] = action_match.group(1).lower()
-    
-    # Extract selector if present
-    selector_match = re.search(r'selector:\s*([^\n]+)', response_text, re.IGNORECASE)
-    if selector_match:
-        result["selector"] = selector_match.group(1).strip()
-    
-    # Extract amount if present
-    amount_match = re.search(r'amount:\s*(-?\d+)', response_text, re.IGNORECASE)
-    if amount_match:
-        result["amount"] = int(amount_match.group(1))
-    
-    # Extract reasoning if present
-    reasoning_match = re.search(r'reasoning:\s*([^\n]+)', response_text, re.IGNORECASE)
-    if reasoning_match:
-        result["reasoning"] = reasoning_match.group(1).strip()
-    
+    for line in response_text.splitlines():
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        # Tolerate bullet/markdown decoration around the key
+        key = key.strip().lstrip('-*').strip().lower()
+        if key not in _RESPONSE_KEYS or key in result:
+            continue
+        value = value.strip()
+        if not value:
+            continue
+        if key == "action":
+            result["action"] = value.split()[0].rstrip(',').lower()
+        elif key == "amount":
+            try:
+                result["amount"] = int(value.split()[0].rstrip(','))
+            except ValueError:
+                pass
+        else:
+            result[key] = value
+
+    # The partition pass only sees line-leading keys; pick up any fields
+    # embedded later in a line (e.g. after the action on the same line)
+    for key, pattern in _INLINE_RES.items():
+        if key in result:
+            continue
+        match = pattern.search(response_text)
+        if match:
+            value = match.group(1).strip()
+            if key == "action":
+                value = value.lower()
+            elif key == "selector":
+                # Don't let a trailing ", reasoning: ..." ride along
+                value = _INLINE_STOP_RE.split(value)[0].rstrip(', ')
+            result[key] = int(value) if key == "amount" else value
     return result
 
-if st.button("Execute Task"):
+# Handlers submit the parsed action to the driver pool and return its
+# future (or None when the decision lacked a usable selector). 'complete'
+# stays a pre-dispatch sentinel in the loop - it ends the task rather
+# than driving the browser.
+def _make_pointer_handler(action, verb):
+    def handler(agent, parsed, pool, task):
+        selector = parsed.get("selector")
+        if not selector:
+            return None
+        st.write(f"{verb} element: {selector}")
+        return pool.submit(agent.perform_action, action,
+                           selector=selector, current_task=task)
+    return handler
+
+def _submit_scroll(agent, parsed, pool, task):
+    amount = parsed.get("amount", 500)  # Default to 500 pixels if not specified
+    st.write(f"Scrolling by {amount} pixels")
+    return pool.submit(agent.perform_action, "scroll", amount=amount)
+
+ACTION_HANDLERS = {
+    "click": _make_pointer_handler("click", "Clicking"),
+    "hover": _make_pointer_handler("hover", "Hovering over"),
+    "scroll": _submit_scroll,
+}
+
+start_clicked = st.button("Execute Task")
+
+# Offer to pick an interrupted task back up instead of redoing its steps
+resume_clicked = False
+if 0 < st.session_state.step < 10 and st.session_state.conversation_history:
+    resume_clicked = st.button(f"Resume task (from step {st.session_state.step + 1})")
+
+# The task loop runs inside a fragment: interacting with widgets it
+# renders (expanders, the saved-content preview, ...) reruns just this
+# function, not the whole script with its imports and widget rebuild.
+@st.fragment
+def run_agent_loop(agent, url, instruction, fresh):
     try:
-        with st.spinner("Initializing undetected Chrome browser..."):
-            # Create browser agent with specified headless setting
-            agent = BrowserAgent(headless=headless)
-            st.success("Browser initialized successfully - using undetected_chromedriver for enhanced bot protection")
-        
-        with st.spinner(f"Navigating to {url}..."):
-            navigation_success = agent.navigate(url)
-            
-        if not navigation_success:
-            st.error("Failed to navigate to the URL. The site may be blocking automated access.")
-            agent.close()
-            st.stop()
+        prev_shot_hash = None
+        if fresh:
+            # Explicit new task: reset persisted progress and navigate;
+            # resuming keeps the browser wherever the task left off
+            with st.spinner(f"Navigating to {url}..."):
+                navigation_success = agent.navigate(url)
 
-        screenshot_bytes = agent.screenshot()
-        img = Image.open(BytesIO(screenshot_bytes))
-        st.image(img, caption="Initial Screenshot")
-        st.session_state.action_history.append(f"Navigated to {url}")
+            if not navigation_success:
+                st.error("Failed to navigate to the URL. The site may be blocking automated access.")
+                st.stop()
 
-        html_content = agent.get_html()
+            # st.image accepts raw PNG/JPEG bytes; no need to decode via PIL
+            screenshot_bytes = agent.screenshot()
+            st.image(prepare_display_image(screenshot_bytes, hd_screenshots), caption="Initial Screenshot")
+            st.session_state.action_history.append(f"Navigated to {url}")
+            prev_shot_hash = hashlib.blake2b(screenshot_bytes, digest_size=16).digest()
 
-        conversation_history = [
-            {"role": "system", "content": "You are an autonomous web browsing agent."},
-            {"role": "user", "content": f"Browse this website: {url}\nTask: {instruction}"}
-        ]
+            st.session_state.conversation_history = [
+                {"role": "system", "content": "You are an autonomous web browsing agent."},
+                {"role": "user", "content": f"Browse this website: {url}\nTask: {instruction}"}
+            ]
+            st.session_state.step = 0
 
-        for i in range(10):
-            with st.spinner("AI is analyzing the page..."):
-                next_action_text = agent.get_ai_decision(html_content=agent.get_html(), conversation_history=conversation_history)
-            
-            # Display the AI's thought process
-            with st.expander(f"Step {i+1}: AI Decision", expanded=True):
-                st.write(next_action_text)
+        conversation_history = st.session_state.conversation_history
+
+        driver_pool = get_driver_pool()
+        # One HTML fetch per step; after each action the next fetch runs on
+        # the driver thread while the step's UI is being rendered
+        html_content = agent.get_html()
+        prev_html_hash = None
+        last_action_completed = True
+        fail_streak = 0
+        last_selector = None
+
+        for i in range(st.session_state.step, 10):
+            html_hash = hashlib.blake2b(html_content.encode(), digest_size=16).digest()
+            if html_hash == prev_html_hash and not last_action_completed:
+                # The last action failed and the DOM is byte-identical, so
+                # the model would be staring at the same page again - skip
+                # the LLM round-trip and push a canned recovery action
+                next_action_text = (
+                    "action: scroll\namount: 500\n"
+                    "reasoning: The previous action failed and the page did not "
+                    "change, so scrolling to bring different elements into view.")
+                with st.expander(f"Step {i+1}: AI Decision (skipped - page unchanged)", expanded=True):
+                    st.write(next_action_text)
+            else:
+                # Stream the AI's thought process as it is generated instead
+                # of spinning until the full completion arrives
+                with st.expander(f"Step {i+1}: AI Decision", expanded=True):
+                    next_action_text = st.write_stream(
+                        agent.get_ai_decision_stream(
+                            html_content=html_content,
+                            conversation_history=conversation_history))
+            prev_html_hash = html_hash
             
             # Parse the AI response
             parsed_action = parse_ai_response(next_action_text)
@@ -100,27 +265,10 @@ if st.button("Execute Task"):
             # Add to conversation history for context
             conversation_history.append({"role": "assistant", "content": next_action_text})
             
-            # Execute the action
-            action_completed = False
-            if parsed_action.get("action") == "click":
-                selector = parsed_action.get("selector")
-                if selector:
-                    st.write(f"Clicking element: {selector}")
-                    with st.spinner("Performing click action..."):
-                        action_completed = agent.perform_action("click", selector=selector, current_task=instruction)
-            elif parsed_action.get("action") == "hover":
-                selector = parsed_action.get("selector")
-                if selector:
-                    st.write(f"Hovering over element: {selector}")
-                    with st.spinner("Performing hover action..."):
-                        action_completed = agent.perform_action("hover", selector=selector, current_task=instruction)
-            elif parsed_action.get("action") == "scroll":
-                amount = parsed_action.get("amount", 500)  # Default to 500 pixels if not specified
-                st.write(f"Scrolling by {amount} pixels")
-                with st.spinner("Performing scroll action..."):
-                    action_completed = agent.perform_action("scroll", amount=amount)
-            elif parsed_action.get("action") == "complete":
+            action_name = parsed_action.get("action")
+            if action_name == "complete":
                 st.success("Task completed successfully!")
+                st.session_state.step = 0
                 
                 # Save only the body content when task is complete
                 with st.spinner("Saving page content..."):
@@ -134,36 +282,88 @@ if st.button("Execute Task"):
                             with st.expander("Preview of saved body content", expanded=False):
                                 st.code(body_content[:2000] + ("..." if len(body_content) > 2000 else ""), language="html")
                 break
-                
+            
+            # Submit the action to the driver thread instead of blocking on
+            # it inline; the status line and decision expander flush to the
+            # client while Selenium works
+            handler = ACTION_HANDLERS.get(action_name)
+            fut_action = handler(agent, parsed_action, driver_pool, instruction) if handler else None
+            
+            # Queue the post-action snapshot (screenshot + HTML) immediately;
+            # the single driver worker serializes it behind the action, so
+            # the whole pipeline runs while the step output renders
+            fut_snap = driver_pool.submit(agent.snapshot)
+
+            action_completed = False
+            if fut_action is not None:
+                with st.spinner("Performing action..."):
+                    action_completed = fut_action.result()
+
+            last_action_completed = action_completed
             if not action_completed:
                 st.warning("Action could not be completed. The agent will try to recover.")
 
+            # Two consecutive failures on the same selector means the agent
+            # is stuck; stop instead of burning the remaining steps' LLM
+            # calls on the same dead end
+            selector_used = parsed_action.get("selector")
+            if not action_completed:
+                fail_streak = fail_streak + 1 if selector_used == last_selector else 1
+            else:
+                fail_streak = 0
+            last_selector = selector_used
+            if fail_streak >= 2:
+                st.error("The same action failed twice in a row - stopping the task. "
+                         "Rephrase the instructions or try a different starting page.")
+                break
+
             # Display updated screenshot after action
             try:
-                screenshot_bytes = agent.screenshot()
-                img = Image.open(BytesIO(screenshot_bytes))
-                st.image(img, caption=f"Screenshot after step {i+1}")
+                screenshot_bytes, html_content = fut_snap.result()
+                shot_hash = hashlib.blake2b(screenshot_bytes, digest_size=16).digest()
+                if shot_hash == prev_shot_hash:
+                    # Identical frame - skip pushing the same image again
+                    st.caption(f"Screenshot unchanged after step {i+1}")
+                else:
+                    st.image(prepare_display_image(screenshot_bytes, hd_screenshots),
+                             caption=f"Screenshot after step {i+1}")
+                prev_shot_hash = shot_hash
             except Exception as e:
                 st.error(f"Error taking screenshot: {e}")
                 st.warning("Attempting to refresh page state...")
                 try:
                     agent.navigate(agent.current_url)
-                    screenshot_bytes = agent.screenshot()
-                    img = Image.open(BytesIO(screenshot_bytes))
-                    st.image(img, caption=f"Screenshot after recovery")
+                    screenshot_bytes, html_content = agent.snapshot()
+                    st.image(prepare_display_image(screenshot_bytes, hd_screenshots),
+                             caption="Screenshot after recovery")
                 except:
                     st.error("Could not recover browser state.")
-            
+
             # Add user feedback for AI
             conversation_history.append({
                 "role": "user", 
                 "content": "What should I do next to continue with the task?"
             })
+
+            # Record completed progress so an inadvertent rerun can resume
+            st.session_state.step = i + 1
     except Exception as e:
         st.error(f"An error occurred: {e}")
-    finally:
-        # Close the browser when done
-        try:
-            agent.close()
-        except:
-            pass 
\ No newline at end of file
+
+
+if start_clicked or resume_clicked:
+    try:
+        with st.spinner("Initializing undetected Chrome browser..."):
+            # Reuse the cached agent; if its Chrome died since the last run,
+            # drop it from the cache and start a fresh one
+            agent = get_agent(headless)
+            try:
+                _ = agent.driver.current_url
+            except Exception:
+                shutdown_agents()
+                agent = get_agent(headless)
+            st.success("Browser initialized successfully - using undetected_chromedriver for enhanced bot protection")
+    except Exception as e:
+        st.error(f"An error occurred: {e}")
+    else:
+        run_agent_loop(agent, url, instruction, fresh=start_clicked)